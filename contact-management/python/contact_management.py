@@ -5,8 +5,11 @@ SendSeven API - Contact Management Example
 Demonstrates CRUD operations for contacts using the SendSeven API.
 """
 
+import atexit
 import os
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 from typing import Optional
 
@@ -18,14 +21,72 @@ API_TOKEN = os.getenv("SENDSEVEN_API_TOKEN")
 TENANT_ID = os.getenv("SENDSEVEN_TENANT_ID")
 API_URL = os.getenv("SENDSEVEN_API_URL", "https://api.sendseven.com/api/v1")
 
+# Common headers for API requests (built once; the values never change)
+HEADERS = {
+    "Authorization": f"Bearer {API_TOKEN}",  # Bearer token authentication
+    "X-Tenant-ID": TENANT_ID,
+    "Content-Type": "application/json",
+}
+
+# Retry rate limits and transient server errors with exponential backoff.
+# The final failed response is returned so raise_for_status() still applies.
+RETRY_POLICY = Retry(
+    total=3,
+    backoff_factor=1.0,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=frozenset({"GET", "PUT", "DELETE"}),
+    respect_retry_after_header=True,
+    raise_on_status=False,
+)
+
+# POSTs create things, so they are only retried when the API cannot have
+# processed them: the connection failed, or it answered 429 or 503. After
+# a timeout or another 5xx the request may already have taken effect, and
+# sending it again would create a duplicate.
+POST_RETRY_POLICY = Retry(
+    total=3,
+    read=False,
+    backoff_factor=1.0,
+    status_forcelist=(429, 503),
+    allowed_methods=frozenset({"POST"}),
+    respect_retry_after_header=True,
+    raise_on_status=False,
+)
+
+# Timeout (seconds) for each API call
+REQUEST_TIMEOUT = 10
+
+# Shared session so every API call reuses pooled keep-alive connections;
+# POSTs go through their own so they use POST_RETRY_POLICY
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=20, max_retries=RETRY_POLICY))
+SESSION.headers.update(HEADERS)
+POST_SESSION = requests.Session()
+POST_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=20, max_retries=POST_RETRY_POLICY))
+POST_SESSION.headers.update(HEADERS)
+atexit.register(SESSION.close)
+atexit.register(POST_SESSION.close)
+
+
+def _request(method: str, path: str, **kwargs) -> dict:
+    """
+    Send a request to the SendSeven API over the shared session.
 
-def get_headers() -> dict:
-    """Get common headers for API requests."""
-    return {
-        "Authorization": f"Bearer {API_TOKEN}",  # Bearer token authentication
-        "X-Tenant-ID": TENANT_ID,
-        "Content-Type": "application/json",
-    }
+    Args:
+        method: HTTP method
+        path: Endpoint path relative to API_URL
+        **kwargs: Passed through to requests (params, json, ...)
+
+    Returns:
+        dict: The decoded JSON response body
+
+    Raises:
+        requests.HTTPError: If the API request fails
+    """
+    session = POST_SESSION if method == "POST" else SESSION
+    response = session.request(method, f"{API_URL}{path}", timeout=REQUEST_TIMEOUT, **kwargs)
+    response.raise_for_status()
+    return response.json()
 
 
 def create_contact(
@@ -47,20 +108,10 @@ def create_contact(
     Raises:
         requests.HTTPError: If the API request fails
     """
-    url = f"{API_URL}/contacts"
+    fields = {"phone": phone, "email": email, "name": name}
+    payload = {key: value for key, value in fields.items() if value}
 
-    payload = {}
-    if phone:
-        payload["phone"] = phone
-    if email:
-        payload["email"] = email
-    if name:
-        payload["name"] = name
-
-    response = requests.post(url, json=payload, headers=get_headers())
-    response.raise_for_status()
-
-    return response.json()
+    return _request("POST", "/contacts", json=payload)
 
 
 def list_contacts(page: int = 1, page_size: int = 20) -> dict:
@@ -77,13 +128,9 @@ def list_contacts(page: int = 1, page_size: int = 20) -> dict:
     Raises:
         requests.HTTPError: If the API request fails
     """
-    url = f"{API_URL}/contacts"
     params = {"page": page, "page_size": page_size}
 
-    response = requests.get(url, params=params, headers=get_headers())
-    response.raise_for_status()
-
-    return response.json()
+    return _request("GET", "/contacts", params=params)
 
 
 def get_contact(contact_id: str) -> dict:
@@ -99,12 +146,7 @@ def get_contact(contact_id: str) -> dict:
     Raises:
         requests.HTTPError: If the API request fails
     """
-    url = f"{API_URL}/contacts/{contact_id}"
-
-    response = requests.get(url, headers=get_headers())
-    response.raise_for_status()
-
-    return response.json()
+    return _request("GET", f"/contacts/{contact_id}")
 
 
 def update_contact(
@@ -128,20 +170,10 @@ def update_contact(
     Raises:
         requests.HTTPError: If the API request fails
     """
-    url = f"{API_URL}/contacts/{contact_id}"
-
-    payload = {}
-    if phone is not None:
-        payload["phone"] = phone
-    if email is not None:
-        payload["email"] = email
-    if name is not None:
-        payload["name"] = name
+    fields = {"phone": phone, "email": email, "name": name}
+    payload = {key: value for key, value in fields.items() if value is not None}
 
-    response = requests.put(url, json=payload, headers=get_headers())
-    response.raise_for_status()
-
-    return response.json()
+    return _request("PUT", f"/contacts/{contact_id}", json=payload)
 
 
 def delete_contact(contact_id: str) -> dict:
@@ -157,12 +189,7 @@ def delete_contact(contact_id: str) -> dict:
     Raises:
         requests.HTTPError: If the API request fails
     """
-    url = f"{API_URL}/contacts/{contact_id}"
-
-    response = requests.delete(url, headers=get_headers())
-    response.raise_for_status()
-
-    return response.json()
+    return _request("DELETE", f"/contacts/{contact_id}")
 
 
 def main():
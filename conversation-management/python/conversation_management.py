@@ -5,11 +5,14 @@ SendSeven API - Conversation Management Example
 Demonstrates how to list, get, update, and close conversations using the SendSeven API.
 """
 
+import atexit
 import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
-from urllib.parse import urlencode
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -20,14 +23,72 @@ API_TOKEN = os.getenv("SENDSEVEN_API_TOKEN")
 TENANT_ID = os.getenv("SENDSEVEN_TENANT_ID")
 API_URL = os.getenv("SENDSEVEN_API_URL", "https://api.sendseven.com/api/v1")
 
+# Common headers for API requests (built once; the values never change)
+HEADERS = {
+    "Authorization": f"Bearer {API_TOKEN}",  # Bearer token authentication
+    "X-Tenant-ID": TENANT_ID,
+    "Content-Type": "application/json",
+}
+
+# Retry rate limits and transient server errors with exponential backoff.
+# The final failed response is returned so raise_for_status() still applies.
+RETRY_POLICY = Retry(
+    total=3,
+    backoff_factor=1.0,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=frozenset({"GET", "PUT", "DELETE"}),
+    respect_retry_after_header=True,
+    raise_on_status=False,
+)
+
+# POSTs create things, so they are only retried when the API cannot have
+# processed them: the connection failed, or it answered 429 or 503. After
+# a timeout or another 5xx the request may already have taken effect, and
+# sending it again would create a duplicate.
+POST_RETRY_POLICY = Retry(
+    total=3,
+    read=False,
+    backoff_factor=1.0,
+    status_forcelist=(429, 503),
+    allowed_methods=frozenset({"POST"}),
+    respect_retry_after_header=True,
+    raise_on_status=False,
+)
+
+# Timeout (seconds) for each API call
+REQUEST_TIMEOUT = 10
+
+# Shared session so every API call reuses pooled keep-alive connections;
+# POSTs go through their own so they use POST_RETRY_POLICY
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_maxsize=32, max_retries=RETRY_POLICY))
+SESSION.headers.update(HEADERS)
+POST_SESSION = requests.Session()
+POST_SESSION.mount("https://", HTTPAdapter(pool_maxsize=32, max_retries=POST_RETRY_POLICY))
+POST_SESSION.headers.update(HEADERS)
+atexit.register(SESSION.close)
+atexit.register(POST_SESSION.close)
+
+
+def _request(method: str, path: str, **kwargs) -> dict:
+    """
+    Send a request to the SendSeven API over the shared session.
 
-def get_headers() -> dict:
-    """Get common headers for API requests."""
-    return {
-        "Authorization": f"Bearer {API_TOKEN}",  # Bearer token authentication
-        "X-Tenant-ID": TENANT_ID,
-        "Content-Type": "application/json",
-    }
+    Args:
+        method: HTTP method
+        path: Endpoint path relative to API_URL
+        **kwargs: Passed through to requests (params, json, ...)
+
+    Returns:
+        dict: The decoded JSON response body
+
+    Raises:
+        requests.HTTPError: If the API request fails
+    """
+    session = POST_SESSION if method == "POST" else SESSION
+    response = session.request(method, f"{API_URL}{path}", timeout=REQUEST_TIMEOUT, **kwargs)
+    response.raise_for_status()
+    return response.json()
 
 
 def list_conversations(
@@ -59,26 +120,18 @@ def list_conversations(
     Raises:
         requests.HTTPError: If the API request fails
     """
+    filters = {
+        "status": status,
+        "needs_reply": None if needs_reply is None else str(needs_reply).lower(),
+        "assigned_to": assigned_to,
+        "channel": channel,
+        "contact_id": contact_id,
+        "search": search,
+    }
     params = {"page": page, "page_size": page_size}
+    params.update((key, value) for key, value in filters.items() if value)
 
-    if status:
-        params["status"] = status
-    if needs_reply is not None:
-        params["needs_reply"] = str(needs_reply).lower()
-    if assigned_to:
-        params["assigned_to"] = assigned_to
-    if channel:
-        params["channel"] = channel
-    if contact_id:
-        params["contact_id"] = contact_id
-    if search:
-        params["search"] = search
-
-    url = f"{API_URL}/conversations?{urlencode(params)}"
-    response = requests.get(url, headers=get_headers())
-    response.raise_for_status()
-
-    return response.json()
+    return _request("GET", "/conversations", params=params)
 
 
 def get_conversation(conversation_id: str) -> dict:
@@ -94,11 +147,28 @@ def get_conversation(conversation_id: str) -> dict:
     Raises:
         requests.HTTPError: If the API request fails
     """
-    url = f"{API_URL}/conversations/{conversation_id}"
-    response = requests.get(url, headers=get_headers())
-    response.raise_for_status()
+    return _request("GET", f"/conversations/{conversation_id}")
 
-    return response.json()
+
+def get_conversations(conversation_ids: list[str], max_workers: int = 8) -> list[dict]:
+    """
+    Get several conversations concurrently.
+
+    Requests are issued in parallel over the shared session, so fetching a
+    page of conversations takes roughly as long as the slowest single call.
+
+    Args:
+        conversation_ids: The UUIDs of the conversations
+        max_workers: Maximum number of requests in flight at once
+
+    Returns:
+        list: The conversation objects, in the same order as conversation_ids
+
+    Raises:
+        requests.HTTPError: If any API request fails
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(get_conversation, conversation_ids))
 
 
 def update_conversation(conversation_id: str, assigned_to: Optional[str] = None) -> dict:
@@ -115,16 +185,12 @@ def update_conversation(conversation_id: str, assigned_to: Optional[str] = None)
     Raises:
         requests.HTTPError: If the API request fails
     """
-    url = f"{API_URL}/conversations/{conversation_id}"
     payload = {}
 
     if assigned_to is not None:
         payload["assigned_to"] = assigned_to
 
-    response = requests.put(url, json=payload, headers=get_headers())
-    response.raise_for_status()
-
-    return response.json()
+    return _request("PUT", f"/conversations/{conversation_id}", json=payload)
 
 
 def close_conversation(conversation_id: str) -> dict:
@@ -140,11 +206,7 @@ def close_conversation(conversation_id: str) -> dict:
     Raises:
         requests.HTTPError: If the API request fails
     """
-    url = f"{API_URL}/conversations/{conversation_id}/close"
-    response = requests.post(url, headers=get_headers())
-    response.raise_for_status()
-
-    return response.json()
+    return _request("POST", f"/conversations/{conversation_id}/close")
 
 
 def main():
@@ -177,25 +239,26 @@ def main():
             print(f"  Last customer message: {conv.get('last_customer_message_at', 'N/A')}")
             print()
 
-        # Example 2: Get a single conversation (if we have any)
+        # Example 2: Get conversation details (fetched concurrently for the whole page)
         if result["items"]:
-            conversation_id = result["items"][0]["id"]
+            conversation_ids = [conv["id"] for conv in result["items"]]
+            conversation_id = conversation_ids[0]
 
             print("=" * 60)
-            print(f"Getting conversation details: {conversation_id}")
+            print(f"Getting details for {len(conversation_ids)} conversation(s)...")
             print("=" * 60)
 
-            conversation = get_conversation(conversation_id)
-            print(f"  ID: {conversation['id']}")
-            print(f"  Channel: {conversation.get('channel_type', conversation.get('channel', 'N/A'))}")
-            print(f"  Status: {conversation['status']}")
-            print(f"  Needs reply: {conversation.get('needs_reply', False)}")
-            print(f"  Assigned to: {conversation.get('assigned_user_id', 'Unassigned')}")
-            if "contact" in conversation and conversation["contact"]:
-                contact = conversation["contact"]
-                name = contact.get('name') or contact.get('phone') or contact.get('email') or "Unnamed Contact"
-                print(f"  Contact: {name}")
-            print()
+            for conversation in get_conversations(conversation_ids):
+                print(f"  ID: {conversation['id']}")
+                print(f"  Channel: {conversation.get('channel_type', conversation.get('channel', 'N/A'))}")
+                print(f"  Status: {conversation['status']}")
+                print(f"  Needs reply: {conversation.get('needs_reply', False)}")
+                print(f"  Assigned to: {conversation.get('assigned_user_id', 'Unassigned')}")
+                if "contact" in conversation and conversation["contact"]:
+                    contact = conversation["contact"]
+                    name = contact.get('name') or contact.get('phone') or contact.get('email') or "Unnamed Contact"
+                    print(f"  Contact: {name}")
+                print()
 
             # Example 3: Demonstrate update (commented out to avoid modifying data)
             # Uncomment to actually assign a conversation
@@ -7,9 +7,16 @@ A simple bot that automatically replies to incoming messages.
 
 import os
 import hmac
-import hashlib
 import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from flask import Flask, request, jsonify
 from dotenv import load_dotenv
 
@@ -22,28 +29,103 @@ API_TOKEN = os.getenv("SENDSEVEN_API_TOKEN", "")
 TENANT_ID = os.getenv("SENDSEVEN_TENANT_ID", "")
 API_URL = os.getenv("SENDSEVEN_API_URL", "https://api.sendseven.com/api/v1")
 WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_SECRET_BYTES = WEBHOOK_SECRET.encode("utf-8")
 PORT = int(os.getenv("PORT", 3000))
-
-# Track processed delivery IDs to avoid duplicates
-processed_deliveries = set()
+DEBUG = os.getenv("FLASK_DEBUG", "false").lower() in ("true", "1", "yes")
+
+# Retry rate limits and unavailability with exponential backoff. Replies
+# are POSTs, so only failures where the API cannot have processed them are
+# retried: the connection failed, or it answered 429 or 503. After a
+# timeout or another 5xx the reply may already have been sent, and sending
+# it again would message the contact twice.
+# The final failed response is returned so raise_for_status() still applies.
+RETRY_POLICY = Retry(
+    total=3,
+    read=False,
+    backoff_factor=1.0,
+    status_forcelist=(429, 503),
+    allowed_methods=frozenset({"POST"}),
+    respect_retry_after_header=True,
+    raise_on_status=False,
+)
+
+# Timeout (seconds) for each API call, so a stalled connection can't tie
+# up a reply worker indefinitely
+REQUEST_TIMEOUT = 10
+
+# Shared session so replies reuse pooled keep-alive connections
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_maxsize=64, max_retries=RETRY_POLICY))
+SESSION.headers.update({
+    "Authorization": f"Bearer {API_TOKEN}",  # Bearer token authentication
+    "X-Tenant-ID": TENANT_ID,
+    "Content-Type": "application/json",
+})
+
+# Encoder for the canonical JSON form the webhook signature is computed over.
+# Built once, since json.dumps() with custom options creates one per call.
+CANONICAL_JSON = json.JSONEncoder(separators=(",", ":"), sort_keys=True)
+
+# Replies are sent in the background so webhooks are acknowledged immediately
+REPLY_EXECUTOR = ThreadPoolExecutor(max_workers=16)
+
+# Track processed delivery IDs to avoid duplicates. Entries expire after
+# DELIVERY_TTL seconds and the oldest are evicted past MAX_DELIVERIES, so
+# memory stays bounded on a long-running bot.
+MAX_DELIVERIES = 100_000
+DELIVERY_TTL = 3600
+processed_deliveries = OrderedDict()  # delivery_id -> time processed
+processed_lock = threading.Lock()
+
+
+def is_duplicate(delivery_id: str) -> bool:
+    """Check whether a delivery was already processed within the TTL."""
+    with processed_lock:
+        processed_at = processed_deliveries.get(delivery_id)
+    return processed_at is not None and time.monotonic() - processed_at < DELIVERY_TTL
+
+
+def mark_processed(delivery_id: str) -> None:
+    """Remember a delivery ID, evicting expired and excess entries."""
+    now = time.monotonic()
+    with processed_lock:
+        processed_deliveries[delivery_id] = now
+        processed_deliveries.move_to_end(delivery_id)
+
+        # Entries are kept oldest-first, so only the front needs checking
+        while processed_deliveries:
+            processed_at = next(iter(processed_deliveries.values()))
+            if len(processed_deliveries) <= MAX_DELIVERIES and now - processed_at < DELIVERY_TTL:
+                break
+            processed_deliveries.popitem(last=False)
+
+
+def parse_signature(signature: str) -> Optional[bytes]:
+    """Decode a "sha256=<hex>" signature header into the raw digest.
+
+    Returns None for anything that cannot be a SHA-256 signature, so
+    malformed requests are rejected before the body is parsed.
+    """
+    if not signature.startswith("sha256=") or len(signature) != 71:
+        return None
+    try:
+        return bytes.fromhex(signature[7:])
+    except ValueError:
+        return None
 
 
-def verify_signature(payload: bytes, signature: str, timestamp: str) -> bool:
-    """Verify the webhook signature using HMAC-SHA256."""
-    if not signature.startswith("sha256="):
-        return False
+def verify_signature(payload: dict, provided_sig: bytes, timestamp: str) -> bool:
+    """Verify the webhook signature using HMAC-SHA256.
 
-    provided_sig = signature[7:]
-    payload_dict = json.loads(payload)
-    json_payload = json.dumps(payload_dict, separators=(",", ":"), sort_keys=True)
-    message = f"{timestamp}.{json_payload}"
+    Takes the already-parsed payload so the body is only decoded once;
+    the signature covers its canonical (sorted, compact) JSON form.
+    """
+    json_payload = CANONICAL_JSON.encode(payload)
+    message = f"{timestamp}.{json_payload}".encode("utf-8")
 
-    expected_sig = hmac.new(
-        WEBHOOK_SECRET.encode("utf-8"),
-        message.encode("utf-8"),
-        hashlib.sha256
-    ).hexdigest()
+    expected_sig = hmac.digest(WEBHOOK_SECRET_BYTES, message, "sha256")
 
+    # Compare raw digests rather than hex strings
     return hmac.compare_digest(expected_sig, provided_sig)
 
 
@@ -54,23 +136,28 @@ def send_reply(conversation_id: str, text: str) -> dict:
     """
     url = f"{API_URL}/messages"
 
-    headers = {
-        "Authorization": f"Bearer {API_TOKEN}",  # Bearer token authentication
-        "X-Tenant-ID": TENANT_ID,
-        "Content-Type": "application/json",
-    }
-
     payload = {
         "conversation_id": conversation_id,
         "text": text,
         "message_type": "text",
     }
 
-    response = requests.post(url, json=payload, headers=headers)
+    response = SESSION.post(url, json=payload, timeout=REQUEST_TIMEOUT)
     response.raise_for_status()
     return response.json()
 
 
+def send_reply_in_background(conversation_id: str, text: str) -> None:
+    """Send a reply on a worker thread, logging instead of raising on failure."""
+    try:
+        result = send_reply(conversation_id, text)
+        print(f"Reply sent: {result.get('id')}")
+    except requests.HTTPError as e:
+        print(f"Failed to send reply: {e.response.status_code} - {e.response.text}")
+    except Exception as e:
+        print(f"Error sending reply: {e}")
+
+
 @app.route("/webhooks/sendseven", methods=["POST"])
 def handle_webhook():
     """Handle incoming SendSeven webhooks."""
@@ -84,17 +171,27 @@ def handle_webhook():
         return jsonify({"error": "Missing required headers"}), 400
 
     # Check for duplicate delivery (idempotency)
-    if delivery_id in processed_deliveries:
+    if is_duplicate(delivery_id):
         print(f"Duplicate delivery {delivery_id}, skipping")
         return jsonify({"success": True, "duplicate": True}), 200
 
+    # Reject malformed signatures before doing any parsing work
+    provided_sig = parse_signature(signature)
+    if WEBHOOK_SECRET and provided_sig is None:
+        print(f"Invalid signature for delivery {delivery_id}")
+        return jsonify({"error": "Invalid signature"}), 401
+
+    # Parse payload once; it is reused for signature verification below
+    try:
+        payload = json.loads(request.data)
+    except ValueError:
+        return jsonify({"error": "Invalid JSON"}), 400
+
     # Verify signature
-    if WEBHOOK_SECRET and not verify_signature(request.data, signature, timestamp):
+    if WEBHOOK_SECRET and not verify_signature(payload, provided_sig, timestamp):
         print(f"Invalid signature for delivery {delivery_id}")
         return jsonify({"error": "Invalid signature"}), 401
 
-    # Parse payload
-    payload = request.get_json()
     event_type = payload.get("type", "")
 
     # Only process message.received events
@@ -131,15 +228,9 @@ def handle_webhook():
     else:
         reply_text = "I received your message!"
 
-    # Send the reply
-    try:
-        result = send_reply(conversation_id, reply_text)
-        print(f"Reply sent: {result.get('id')}")
-        processed_deliveries.add(delivery_id)
-    except requests.HTTPError as e:
-        print(f"Failed to send reply: {e.response.status_code} - {e.response.text}")
-    except Exception as e:
-        print(f"Error sending reply: {e}")
+    # Send the reply without holding up the webhook response
+    mark_processed(delivery_id)
+    REPLY_EXECUTOR.submit(send_reply_in_background, conversation_id, reply_text)
 
     return jsonify({"success": True}), 200
 
@@ -158,4 +249,7 @@ if __name__ == "__main__":
 
     print(f"Echo Bot starting on port {PORT}")
     print(f"Webhook endpoint: http://localhost:{PORT}/webhooks/sendseven")
-    app.run(host="0.0.0.0", port=PORT, debug=True)
+    if DEBUG:
+        print("Debug mode enabled - do not use in production!")
+    # Development server only; see the README for running under gunicorn
+    app.run(host="0.0.0.0", port=PORT, debug=DEBUG)
@@ -6,8 +6,13 @@ Demonstrates how to send interactive messages (buttons, lists, quick replies)
 using the SendSeven API.
 """
 
+import atexit
 import os
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -20,14 +25,72 @@ API_URL = os.getenv("SENDSEVEN_API_URL", "https://api.sendseven.com/api/v1")
 CHANNEL_ID = os.getenv("CHANNEL_ID")
 CONTACT_ID = os.getenv("CONTACT_ID")
 
+# Common headers for API requests (built once; the values never change)
+HEADERS = {
+    "Authorization": f"Bearer {API_TOKEN}",  # Bearer token authentication
+    "X-Tenant-ID": TENANT_ID,
+    "Content-Type": "application/json",
+}
+
+# Retry rate limits and transient server errors with exponential backoff.
+# The final failed response is returned so raise_for_status() still applies.
+RETRY_POLICY = Retry(
+    total=3,
+    backoff_factor=1.0,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=frozenset({"GET", "PUT", "DELETE"}),
+    respect_retry_after_header=True,
+    raise_on_status=False,
+)
+
+# POSTs create things, so they are only retried when the API cannot have
+# processed them: the connection failed, or it answered 429 or 503. After
+# a timeout or another 5xx the request may already have taken effect, and
+# sending it again would create a duplicate.
+POST_RETRY_POLICY = Retry(
+    total=3,
+    read=False,
+    backoff_factor=1.0,
+    status_forcelist=(429, 503),
+    allowed_methods=frozenset({"POST"}),
+    respect_retry_after_header=True,
+    raise_on_status=False,
+)
+
+# Timeout (seconds) for each API call
+REQUEST_TIMEOUT = 10
+
+# Shared session so concurrent sends reuse pooled keep-alive connections;
+# POSTs go through their own so they use POST_RETRY_POLICY
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_maxsize=10, max_retries=RETRY_POLICY))
+SESSION.headers.update(HEADERS)
+POST_SESSION = requests.Session()
+POST_SESSION.mount("https://", HTTPAdapter(pool_maxsize=10, max_retries=POST_RETRY_POLICY))
+POST_SESSION.headers.update(HEADERS)
+atexit.register(SESSION.close)
+atexit.register(POST_SESSION.close)
+
+
+def _request(method: str, path: str, **kwargs) -> dict:
+    """
+    Send a request to the SendSeven API over the shared session.
 
-def get_headers() -> dict:
-    """Get common headers for API requests."""
-    return {
-        "Authorization": f"Bearer {API_TOKEN}",  # Bearer token authentication
-        "X-Tenant-ID": TENANT_ID,
-        "Content-Type": "application/json",
-    }
+    Args:
+        method: HTTP method
+        path: Endpoint path relative to API_URL
+        **kwargs: Passed through to requests (params, json, ...)
+
+    Returns:
+        dict: The decoded JSON response body
+
+    Raises:
+        requests.HTTPError: If the API request fails
+    """
+    session = POST_SESSION if method == "POST" else SESSION
+    response = session.request(method, f"{API_URL}{path}", timeout=REQUEST_TIMEOUT, **kwargs)
+    response.raise_for_status()
+    return response.json()
 
 
 def check_channel_capabilities(channel_id: str) -> dict:
@@ -43,10 +106,7 @@ def check_channel_capabilities(channel_id: str) -> dict:
     Raises:
         requests.HTTPError: If the API request fails
     """
-    url = f"{API_URL}/channels/{channel_id}/capabilities"
-    response = requests.get(url, headers=get_headers())
-    response.raise_for_status()
-    return response.json()
+    return _request("GET", f"/channels/{channel_id}/capabilities")
 
 
 def send_button_message(
@@ -70,8 +130,6 @@ def send_button_message(
     Raises:
         requests.HTTPError: If the API request fails
     """
-    url = f"{API_URL}/messages/send/interactive"
-
     payload = {
         "channel_id": channel_id,
         "contact_id": contact_id,
@@ -80,9 +138,7 @@ def send_button_message(
         "buttons": buttons,
     }
 
-    response = requests.post(url, json=payload, headers=get_headers())
-    response.raise_for_status()
-    return response.json()
+    return _request("POST", "/messages/send/interactive", json=payload)
 
 
 def send_list_message(
@@ -108,8 +164,6 @@ def send_list_message(
     Raises:
         requests.HTTPError: If the API request fails
     """
-    url = f"{API_URL}/messages/send/interactive"
-
     payload = {
         "channel_id": channel_id,
         "contact_id": contact_id,
@@ -119,9 +173,7 @@ def send_list_message(
         "sections": sections,
     }
 
-    response = requests.post(url, json=payload, headers=get_headers())
-    response.raise_for_status()
-    return response.json()
+    return _request("POST", "/messages/send/interactive", json=payload)
 
 
 def send_quick_reply_message(
@@ -145,8 +197,6 @@ def send_quick_reply_message(
     Raises:
         requests.HTTPError: If the API request fails
     """
-    url = f"{API_URL}/messages/send/interactive"
-
     payload = {
         "channel_id": channel_id,
         "contact_id": contact_id,
@@ -155,9 +205,7 @@ def send_quick_reply_message(
         "buttons": buttons,
     }
 
-    response = requests.post(url, json=payload, headers=get_headers())
-    response.raise_for_status()
-    return response.json()
+    return _request("POST", "/messages/send/interactive", json=payload)
 
 
 def main():
@@ -193,93 +241,79 @@ def main():
         print("Proceeding anyway...")
         print()
 
-    # 2. Send a button message
-    print("Sending button message...")
-    try:
-        buttons = [
-            {"id": "yes", "title": "Yes"},
-            {"id": "no", "title": "No"},
-            {"id": "maybe", "title": "Maybe Later"},
-        ]
-
-        message = send_button_message(
-            channel_id=CHANNEL_ID,
-            contact_id=CONTACT_ID,
-            body="Would you like to proceed with your order?",
-            buttons=buttons
-        )
-
-        print("Button message sent successfully!")
-        print(f"  ID: {message['id']}")
-        print(f"  Status: {message['status']}")
-        print()
-
-    except requests.HTTPError as e:
-        print(f"Button message failed: {e.response.status_code}")
-        print(f"Response: {e.response.text}")
-        print()
-
-    # 3. Send a list message
-    print("Sending list message...")
-    try:
-        sections = [
-            {
-                "title": "Electronics",
-                "rows": [
-                    {"id": "phones", "title": "Phones", "description": "Latest smartphones"},
-                    {"id": "laptops", "title": "Laptops", "description": "Portable computers"},
-                ],
-            },
-            {
-                "title": "Accessories",
-                "rows": [
-                    {"id": "cases", "title": "Cases", "description": "Protective cases"},
-                    {"id": "chargers", "title": "Chargers", "description": "Fast chargers"},
-                ],
-            },
-        ]
-
-        message = send_list_message(
-            channel_id=CHANNEL_ID,
-            contact_id=CONTACT_ID,
-            body="Browse our product catalog:",
-            button_text="View Products",
-            sections=sections
-        )
-
-        print("List message sent successfully!")
-        print(f"  ID: {message['id']}")
-        print(f"  Status: {message['status']}")
-        print()
-
-    except requests.HTTPError as e:
-        print(f"List message failed: {e.response.status_code}")
-        print(f"Response: {e.response.text}")
-        print()
-
-    # 4. Send a quick reply message
-    print("Sending quick reply message...")
-    try:
-        quick_replies = [
-            {"id": "excellent", "title": "Excellent"},
-            {"id": "good", "title": "Good"},
-            {"id": "poor", "title": "Poor"},
-        ]
-
-        message = send_quick_reply_message(
-            channel_id=CHANNEL_ID,
-            contact_id=CONTACT_ID,
-            body="How would you rate our service today?",
-            buttons=quick_replies
-        )
-
-        print("Quick reply message sent successfully!")
-        print(f"  ID: {message['id']}")
-        print(f"  Status: {message['status']}")
-
-    except requests.HTTPError as e:
-        print(f"Quick reply message failed: {e.response.status_code}")
-        print(f"Response: {e.response.text}")
+    # 2-4. Send button, list, and quick reply messages concurrently.
+    # The three sends are independent, so the total wait is roughly that of
+    # the slowest one. Note that they may arrive in any order.
+    buttons = [
+        {"id": "yes", "title": "Yes"},
+        {"id": "no", "title": "No"},
+        {"id": "maybe", "title": "Maybe Later"},
+    ]
+
+    sections = [
+        {
+            "title": "Electronics",
+            "rows": [
+                {"id": "phones", "title": "Phones", "description": "Latest smartphones"},
+                {"id": "laptops", "title": "Laptops", "description": "Portable computers"},
+            ],
+        },
+        {
+            "title": "Accessories",
+            "rows": [
+                {"id": "cases", "title": "Cases", "description": "Protective cases"},
+                {"id": "chargers", "title": "Chargers", "description": "Fast chargers"},
+            ],
+        },
+    ]
+
+    quick_replies = [
+        {"id": "excellent", "title": "Excellent"},
+        {"id": "good", "title": "Good"},
+        {"id": "poor", "title": "Poor"},
+    ]
+
+    print("Sending button, list, and quick reply messages...")
+    print()
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = {
+            "Button": executor.submit(
+                send_button_message,
+                channel_id=CHANNEL_ID,
+                contact_id=CONTACT_ID,
+                body="Would you like to proceed with your order?",
+                buttons=buttons
+            ),
+            "List": executor.submit(
+                send_list_message,
+                channel_id=CHANNEL_ID,
+                contact_id=CONTACT_ID,
+                body="Browse our product catalog:",
+                button_text="View Products",
+                sections=sections
+            ),
+            "Quick reply": executor.submit(
+                send_quick_reply_message,
+                channel_id=CHANNEL_ID,
+                contact_id=CONTACT_ID,
+                body="How would you rate our service today?",
+                buttons=quick_replies
+            ),
+        }
+
+    for label, future in futures.items():
+        try:
+            message = future.result()
+
+            print(f"{label} message sent successfully!")
+            print(f"  ID: {message['id']}")
+            print(f"  Status: {message['status']}")
+            print()
+
+        except requests.HTTPError as e:
+            print(f"{label} message failed: {e.response.status_code}")
+            print(f"Response: {e.response.text}")
+            print()
 
 
 if __name__ == "__main__":
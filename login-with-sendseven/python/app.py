@@ -10,14 +10,22 @@ import secrets
 import hashlib
 import base64
 import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlencode
 from functools import wraps
+from http.cookiejar import DefaultCookiePolicy
+from typing import Optional
 
 import requests
-from flask import Flask, request, redirect, session, jsonify, render_template_string
+from requests.adapters import HTTPAdapter
+from flask import Flask, Response, request, redirect, session, jsonify, render_template
 from dotenv import load_dotenv
-from jose import jwt, jwk
-from jose.exceptions import JWTError
+import jwt
+from jwt.algorithms import RSAAlgorithm
+from jwt.exceptions import InvalidTokenError
 
 load_dotenv()
 
@@ -30,101 +38,295 @@ CLIENT_SECRET = os.getenv("SENDSEVEN_CLIENT_SECRET", "")
 API_URL = os.getenv("SENDSEVEN_API_URL", "https://api.sendseven.com").rstrip("/")
 REDIRECT_URI = os.getenv("REDIRECT_URI", "http://localhost:3000/callback")
 PORT = int(os.getenv("PORT", 3000))
+DEBUG = os.getenv("FLASK_DEBUG", "false").lower() in ("true", "1", "yes")
+
+# Shared session so calls to the SendSeven API reuse keep-alive connections.
+# It is shared by all users, so it must never keep cookies between requests.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=20))
+SESSION.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+# Timeouts (seconds) for calls to the SendSeven API. Discovery and JWKS
+# fetches hold a lock that other logins wait on, so they get less time.
+REQUEST_TIMEOUT = 10
+DISCOVERY_TIMEOUT = 5
 
 # OIDC endpoints (will be fetched from discovery)
 DISCOVERY_URL = f"{API_URL}/.well-known/openid-configuration"
-JWKS_CACHE = {"keys": [], "fetched_at": 0}
+DEFAULT_JWKS_URI = f"{API_URL}/.well-known/jwks.json"
+
+# Authorization URL with its static query parameters; /login appends the
+# per-request state, code_challenge and nonce
+AUTHORIZE_URL_PREFIX = f"{API_URL}/api/v1/oauth-apps/authorize?" + urlencode({
+    "client_id": CLIENT_ID,
+    "redirect_uri": REDIRECT_URI,
+    "response_type": "code",
+    "scope": "openid profile email offline_access",
+    "code_challenge_method": "S256",
+})
+
+# Discovery document and JWKS are cached for CACHE_TTL seconds (or the
+# response's Cache-Control max-age) so logins don't refetch them every time
+CACHE_TTL = 3600
+OIDC_CONFIG_CACHE = {"config": None, "fetched_at": 0, "ttl": CACHE_TTL}
+OIDC_CONFIG_LOCK = threading.Lock()
+JWKS_CACHE = {
+    "by_kid": {},      # kid -> parsed RSA public key
+    "jwk_by_kid": {},  # kid -> JWK it was parsed from
+    "uri": None,
+    "fetched_at": 0,
+    "ttl": CACHE_TTL,
+}
+JWKS_LOCK = threading.Lock()
+# Minimum seconds between JWKS refetches triggered by an unknown kid
+JWKS_MIN_REFRESH_INTERVAL = 60
+# Runs the discovery and JWKS fetches side by side on a cold cache
+WARMUP_EXECUTOR = ThreadPoolExecutor(max_workers=2)
+# Fetches userinfo during the callback while the ID token is being verified
+USERINFO_EXECUTOR = ThreadPoolExecutor(max_workers=8)
+
+# Optional short-lived cache of verified ID token claims, keyed by the
+# token's SHA-256 (the raw token is never stored). Off by default; entries
+# live at most CLAIMS_CACHE_TTL seconds and never past the token's exp.
+CACHE_ID_TOKEN_CLAIMS = os.getenv("CACHE_ID_TOKEN_CLAIMS", "false").lower() in ("true", "1", "yes")
+CLAIMS_CACHE_TTL = 10
+CLAIMS_CACHE_MAX_SIZE = 1000
+CLAIMS_CACHE = OrderedDict()  # token hash -> (claims, expires_at)
+CLAIMS_CACHE_LOCK = threading.Lock()
+
+# Opt-in: skip the RS256 signature check on ID tokens. The callback gets
+# the token straight from the token endpoint, and OIDC Core 3.1.3.7 allows
+# TLS server validation of that channel to stand in for the signature.
+# iss, aud, exp and nonce are still checked. Only honoured over https.
+SKIP_CALLBACK_IDTOKEN_SIG_VERIFY = (
+    os.getenv("SKIP_CALLBACK_IDTOKEN_SIG_VERIFY", "false").lower() in ("true", "1", "yes")
+    and API_URL.startswith("https://")
+)
 
 
 # =============================================================================
 # PKCE Helpers
 # =============================================================================
 
-def generate_code_verifier(length: int = 64) -> str:
-    """Generate a cryptographically random code verifier for PKCE."""
-    # Use URL-safe base64 characters
-    return secrets.token_urlsafe(length)[:128]
+def urlsafe(raw: bytes) -> str:
+    """Encode bytes as unpadded URL-safe base64."""
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
 
 
-def generate_code_challenge(verifier: str) -> str:
-    """Generate S256 code challenge from verifier."""
-    digest = hashlib.sha256(verifier.encode("utf-8")).digest()
-    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode("utf-8")
+def generate_login_secrets() -> tuple:
+    """
+    Generate the PKCE code verifier, state and nonce for one login.
 
+    All three come from a single read of the OS RNG, split into
+    non-overlapping slices so they stay independent.
 
-def generate_state() -> str:
-    """Generate a random state parameter for CSRF protection."""
-    return secrets.token_urlsafe(32)
+    Returns:
+        tuple: (code_verifier, state, nonce)
+    """
+    raw = os.urandom(48 + 32 + 32)
+    # 48 random bytes encode to a 64-character verifier (RFC 7636 allows
+    # 43-128); state (CSRF protection) and nonce (ID token replay
+    # protection) get 32 bytes each
+    return urlsafe(raw[:48]), urlsafe(raw[48:80]), urlsafe(raw[80:])
 
 
-def generate_nonce() -> str:
-    """Generate a random nonce for ID token replay protection."""
-    return secrets.token_urlsafe(32)
+def generate_code_challenge(verifier: str) -> str:
+    """Generate S256 code challenge from verifier."""
+    digest = hashlib.sha256(verifier.encode("utf-8")).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode("utf-8")
 
 
 # =============================================================================
 # OIDC Discovery and JWKS
 # =============================================================================
 
+def get_cache_ttl(response: requests.Response) -> int:
+    """Get the cache lifetime from Cache-Control max-age, or CACHE_TTL."""
+    for directive in response.headers.get("Cache-Control", "").split(","):
+        name, _, value = directive.strip().partition("=")
+        if name.lower() == "max-age" and value.isdigit():
+            return int(value)
+    return CACHE_TTL
+
+
 def get_oidc_config() -> dict:
-    """Fetch OIDC discovery document."""
-    response = requests.get(DISCOVERY_URL)
-    response.raise_for_status()
-    return response.json()
+    """Fetch OIDC discovery document (cached)."""
+    # Fast path: no locking while the cached document is still fresh
+    if time.time() - OIDC_CONFIG_CACHE["fetched_at"] <= OIDC_CONFIG_CACHE["ttl"]:
+        return OIDC_CONFIG_CACHE["config"]
+
+    # The lock makes concurrent logins share a single fetch; the check is
+    # repeated because another thread may have refreshed it meanwhile
+    with OIDC_CONFIG_LOCK:
+        if time.time() - OIDC_CONFIG_CACHE["fetched_at"] > OIDC_CONFIG_CACHE["ttl"]:
+            response = SESSION.get(DISCOVERY_URL, timeout=DISCOVERY_TIMEOUT)
+            response.raise_for_status()
+            OIDC_CONFIG_CACHE["config"] = response.json()
+            OIDC_CONFIG_CACHE["ttl"] = get_cache_ttl(response)
+            OIDC_CONFIG_CACHE["fetched_at"] = time.time()
+        return OIDC_CONFIG_CACHE["config"]
+
+
+def get_jwks(jwks_uri: str, force_refresh: bool = False) -> dict:
+    """
+    Fetch JSON Web Key Set for ID token verification (cached).
 
+    Keys are parsed into RSA public key objects and indexed by kid, so
+    verifying a token is a dict lookup rather than a key parse. On refresh
+    only new or changed keys are parsed; keys dropped from the set are
+    forgotten.
+    """
+    fetched_at = JWKS_CACHE["fetched_at"]
+    if not force_refresh and time.time() - fetched_at <= JWKS_CACHE["ttl"]:
+        return JWKS_CACHE["by_kid"]
+
+    # Single-flight refresh: if another thread refreshed the keys while we
+    # waited for the lock, use its result instead of fetching again
+    with JWKS_LOCK:
+        if JWKS_CACHE["fetched_at"] == fetched_at:
+            response = SESSION.get(jwks_uri, timeout=DISCOVERY_TIMEOUT)
+            response.raise_for_status()
+            jwk_by_kid = {
+                k.get("kid"): k
+                for k in response.json().get("keys", [])
+                if k.get("kty") == "RSA"
+            }
+            old_keys, old_jwks = JWKS_CACHE["by_kid"], JWKS_CACHE["jwk_by_kid"]
+            JWKS_CACHE["by_kid"] = {
+                kid: old_keys[kid] if old_jwks.get(kid) == k else RSAAlgorithm.from_jwk(k)
+                for kid, k in jwk_by_kid.items()
+            }
+            JWKS_CACHE["jwk_by_kid"] = jwk_by_kid
+            JWKS_CACHE["uri"] = jwks_uri
+            JWKS_CACHE["ttl"] = get_cache_ttl(response)
+            JWKS_CACHE["fetched_at"] = time.time()
+        return JWKS_CACHE["by_kid"]
+
+
+def warm_oidc_caches() -> None:
+    """
+    Prefetch the discovery document and JWKS in parallel.
 
-def get_jwks(jwks_uri: str) -> dict:
-    """Fetch JSON Web Key Set for ID token verification."""
-    import time
-    # Cache JWKS for 1 hour
-    if time.time() - JWKS_CACHE["fetched_at"] > 3600:
-        response = requests.get(jwks_uri)
-        response.raise_for_status()
-        JWKS_CACHE["keys"] = response.json().get("keys", [])
-        JWKS_CACHE["fetched_at"] = time.time()
-    return {"keys": JWKS_CACHE["keys"]}
+    The JWKS is fetched speculatively from the last known jwks_uri (or
+    its standard path) while discovery is in flight; if discovery
+    advertises a different jwks_uri, the keys are refetched from there.
+    """
+    speculative_uri = JWKS_CACHE["uri"] or DEFAULT_JWKS_URI
+    config_future = WARMUP_EXECUTOR.submit(get_oidc_config)
+    jwks_future = WARMUP_EXECUTOR.submit(get_jwks, speculative_uri)
+    oidc_config = config_future.result()
+    speculative_ok = jwks_future.exception() is None
+
+    if not speculative_ok or oidc_config["jwks_uri"] != speculative_uri:
+        get_jwks(oidc_config["jwks_uri"], force_refresh=True)
+
+
+def get_cached_claims(token_hash: str) -> Optional[dict]:
+    """Return previously verified claims for a token hash, if still valid."""
+    with CLAIMS_CACHE_LOCK:
+        entry = CLAIMS_CACHE.get(token_hash)
+        if entry is None:
+            return None
+        claims, expires_at = entry
+        if time.time() >= expires_at:
+            del CLAIMS_CACHE[token_hash]
+            return None
+        return claims
+
+
+def cache_claims(token_hash: str, claims: dict) -> None:
+    """Remember verified claims, evicting the oldest entries past the size cap."""
+    expires_at = min(claims.get("exp", 0), time.time() + CLAIMS_CACHE_TTL)
+    with CLAIMS_CACHE_LOCK:
+        CLAIMS_CACHE[token_hash] = (claims, expires_at)
+        CLAIMS_CACHE.move_to_end(token_hash)
+        while len(CLAIMS_CACHE) > CLAIMS_CACHE_MAX_SIZE:
+            CLAIMS_CACHE.popitem(last=False)
 
 
 def verify_id_token(id_token: str, nonce: str) -> dict:
     """Verify ID token signature and claims."""
     try:
-        # Get OIDC config for issuer and jwks_uri
-        oidc_config = get_oidc_config()
-        jwks = get_jwks(oidc_config["jwks_uri"])
-
-        # Decode header to get kid
-        header = jwt.get_unverified_header(id_token)
-        kid = header.get("kid")
-
-        # Find matching key
-        key = None
-        for k in jwks["keys"]:
-            if k.get("kid") == kid:
-                key = k
-                break
-
-        if not key:
-            raise JWTError(f"No matching key found for kid: {kid}")
-
-        # Verify and decode token
-        claims = jwt.decode(
-            id_token,
-            key,
-            algorithms=["RS256"],
-            audience=CLIENT_ID,
-            issuer=oidc_config["issuer"],
-        )
+        # Skip the RS256 verification for a token verified moments ago
+        token_hash = None
+        if CACHE_ID_TOKEN_CLAIMS:
+            token_hash = hashlib.sha256(id_token.encode("utf-8")).hexdigest()
+            claims = get_cached_claims(token_hash)
+            if claims is not None:
+                if claims.get("nonce") != nonce:
+                    raise InvalidTokenError("Invalid nonce")
+                return claims
+
+        if SKIP_CALLBACK_IDTOKEN_SIG_VERIFY:
+            # Trust the TLS channel to the token endpoint; check claims only
+            oidc_config = get_oidc_config()
+            claims = jwt.decode(
+                id_token,
+                algorithms=["RS256"],
+                audience=CLIENT_ID,
+                issuer=oidc_config["issuer"],
+                options={
+                    "verify_signature": False,
+                    "verify_aud": True,
+                    "verify_iss": True,
+                    "verify_exp": True,
+                    "require": ["aud", "iss", "exp"],
+                },
+            )
+        else:
+            # On a cold start, fetch discovery and JWKS in parallel
+            if not JWKS_CACHE["fetched_at"]:
+                warm_oidc_caches()
+
+            # Get OIDC config for issuer and jwks_uri
+            oidc_config = get_oidc_config()
+            jwks = get_jwks(oidc_config["jwks_uri"])
+
+            # Decode header to get kid
+            header = jwt.get_unverified_header(id_token)
+            kid = header.get("kid")
+
+            # Find matching key, refetching once in case the keys were rotated.
+            # Refetches are rate limited so tokens with made-up kids can't force
+            # a JWKS request on every callback.
+            key = jwks.get(kid)
+            if not key and time.time() - JWKS_CACHE["fetched_at"] > JWKS_MIN_REFRESH_INTERVAL:
+                key = get_jwks(oidc_config["jwks_uri"], force_refresh=True).get(kid)
+
+            if not key:
+                raise InvalidTokenError(f"No matching key found for kid: {kid}")
+
+            # Verify and decode token
+            claims = jwt.decode(
+                id_token,
+                key,
+                algorithms=["RS256"],
+                audience=CLIENT_ID,
+                issuer=oidc_config["issuer"],
+            )
 
         # Verify nonce
         if claims.get("nonce") != nonce:
-            raise JWTError("Invalid nonce")
+            raise InvalidTokenError("Invalid nonce")
+
+        if token_hash:
+            cache_claims(token_hash, claims)
 
         return claims
-    except JWTError as e:
+    except InvalidTokenError as e:
         print(f"ID token verification failed: {e}")
         raise
 
 
+def fetch_userinfo(access_token: str) -> dict:
+    """Fetch the user's profile from the userinfo endpoint."""
+    userinfo_url = f"{API_URL}/api/v1/oauth-apps/userinfo"
+    headers = {"Authorization": f"Bearer {access_token}"}
+    response = SESSION.get(userinfo_url, headers=headers, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+
 # =============================================================================
 # Auth Helpers
 # =============================================================================
@@ -216,6 +418,13 @@ ERROR_TEMPLATE = """
 </html>
 """
 
+# Compile both templates once at startup instead of on every request
+HOME_PAGE = app.jinja_env.from_string(HOME_TEMPLATE)
+ERROR_PAGE = app.jinja_env.from_string(ERROR_TEMPLATE)
+
+# The signed-out home page doesn't depend on the request, so render it once
+ANONYMOUS_HOME_HTML = HOME_PAGE.render(user=None, tokens=None).encode("utf-8")
+
 
 # =============================================================================
 # Routes
@@ -224,19 +433,26 @@ ERROR_TEMPLATE = """
 @app.route("/")
 def home():
     """Home page - show login button or user info."""
+    # Read the session once; the view never modifies it, so Flask sends no
+    # Set-Cookie header back
     user = session.get("user")
+    if not user:
+        # Anonymous visitors only get the pre-rendered sign-in page
+        return Response(ANONYMOUS_HOME_HTML, mimetype="text/html")
+
+    session_tokens = session.get("tokens")
     tokens = None
-    if user and "tokens" in session:
+    if session_tokens:
         # Don't expose full tokens in UI, just metadata
         tokens = {
-            "access_token": session["tokens"]["access_token"][:20] + "...",
-            "token_type": session["tokens"]["token_type"],
-            "expires_in": session["tokens"]["expires_in"],
-            "scope": session["tokens"]["scope"],
-            "has_refresh_token": bool(session["tokens"].get("refresh_token")),
-            "has_id_token": bool(session["tokens"].get("id_token")),
+            "access_token": session_tokens["access_token"][:20] + "...",
+            "token_type": session_tokens["token_type"],
+            "expires_in": session_tokens["expires_in"],
+            "scope": session_tokens["scope"],
+            "has_refresh_token": bool(session_tokens.get("refresh_token")),
+            "has_id_token": bool(session_tokens.get("id_token")),
         }
-    return render_template_string(HOME_TEMPLATE, user=user, tokens=tokens)
+    return render_template(HOME_PAGE, user=user, tokens=tokens)
 
 
 @app.route("/login")
@@ -247,14 +463,10 @@ def login():
     Generates PKCE codes, state, and nonce, stores them in session,
     then redirects to SendSeven's authorization endpoint.
     """
-    # Generate PKCE codes
-    code_verifier = generate_code_verifier()
+    # Generate PKCE codes, state and nonce
+    code_verifier, state, nonce = generate_login_secrets()
     code_challenge = generate_code_challenge(code_verifier)
 
-    # Generate state and nonce
-    state = generate_state()
-    nonce = generate_nonce()
-
     # Store in session for callback verification
     session["oauth_state"] = state
     session["oauth_nonce"] = nonce
@@ -262,17 +474,12 @@ def login():
 
     # Build authorization URL
     params = {
-        "client_id": CLIENT_ID,
-        "redirect_uri": REDIRECT_URI,
-        "response_type": "code",
-        "scope": "openid profile email offline_access",
         "state": state,
         "code_challenge": code_challenge,
-        "code_challenge_method": "S256",
         "nonce": nonce,
     }
 
-    auth_url = f"{API_URL}/api/v1/oauth-apps/authorize?{urlencode(params)}"
+    auth_url = f"{AUTHORIZE_URL_PREFIX}&{urlencode(params)}"
     print(f"Redirecting to: {auth_url}")
 
     return redirect(auth_url)
@@ -290,21 +497,21 @@ def callback():
     error = request.args.get("error")
     if error:
         error_description = request.args.get("error_description", "Unknown error")
-        return render_template_string(ERROR_TEMPLATE, error=error, error_description=error_description)
+        return render_template(ERROR_PAGE, error=error, error_description=error_description)
 
     # Get authorization code
     code = request.args.get("code")
     state = request.args.get("state")
 
     if not code or not state:
-        return render_template_string(ERROR_TEMPLATE,
+        return render_template(ERROR_PAGE,
             error="invalid_request",
             error_description="Missing code or state parameter")
 
     # Validate state (CSRF protection)
     stored_state = session.get("oauth_state")
     if not stored_state or state != stored_state:
-        return render_template_string(ERROR_TEMPLATE,
+        return render_template(ERROR_PAGE,
             error="invalid_state",
             error_description="State mismatch - possible CSRF attack")
 
@@ -326,7 +533,7 @@ def callback():
     print(f"Exchanging code for tokens at: {token_url}")
 
     try:
-        response = requests.post(token_url, data=token_data)
+        response = SESSION.post(token_url, data=token_data, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
         tokens = response.json()
     except requests.RequestException as e:
@@ -335,30 +542,29 @@ def callback():
             error_detail = e.response.json() if e.response else str(e)
         except:
             error_detail = str(e)
-        return render_template_string(ERROR_TEMPLATE,
+        return render_template(ERROR_PAGE,
             error="token_exchange_failed",
             error_description=f"Failed to exchange code for tokens: {error_detail}")
 
+    # Fetch user info in the background while the ID token is verified;
+    # nothing is stored in the session unless both succeed
+    userinfo_future = USERINFO_EXECUTOR.submit(fetch_userinfo, tokens["access_token"])
+
     # Verify ID token if present
     if "id_token" in tokens:
         try:
             id_token_claims = verify_id_token(tokens["id_token"], nonce)
             print(f"ID token verified. Claims: {id_token_claims}")
         except Exception as e:
-            return render_template_string(ERROR_TEMPLATE,
+            userinfo_future.cancel()
+            return render_template(ERROR_PAGE,
                 error="id_token_verification_failed",
                 error_description=f"Failed to verify ID token: {e}")
 
-    # Fetch user info
-    userinfo_url = f"{API_URL}/api/v1/oauth-apps/userinfo"
-    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
-
     try:
-        response = requests.get(userinfo_url, headers=headers)
-        response.raise_for_status()
-        user_info = response.json()
+        user_info = userinfo_future.result()
     except requests.RequestException as e:
-        return render_template_string(ERROR_TEMPLATE,
+        return render_template(ERROR_PAGE,
             error="userinfo_failed",
             error_description=f"Failed to fetch user info: {e}")
 
@@ -384,7 +590,7 @@ def refresh():
     refresh_token = tokens.get("refresh_token")
 
     if not refresh_token:
-        return render_template_string(ERROR_TEMPLATE,
+        return render_template(ERROR_PAGE,
             error="no_refresh_token",
             error_description="No refresh token available. Login again with 'offline_access' scope.")
 
@@ -398,12 +604,12 @@ def refresh():
     }
 
     try:
-        response = requests.post(token_url, data=token_data)
+        response = SESSION.post(token_url, data=token_data, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
         new_tokens = response.json()
     except requests.RequestException as e:
         session.clear()
-        return render_template_string(ERROR_TEMPLATE,
+        return render_template(ERROR_PAGE,
             error="refresh_failed",
             error_description=f"Failed to refresh token: {e}. Please login again.")
 
@@ -431,7 +637,7 @@ def logout():
         }
 
         try:
-            requests.post(revoke_url, data=revoke_data)
+            SESSION.post(revoke_url, data=revoke_data, timeout=REQUEST_TIMEOUT)
             print("Token revoked successfully")
         except requests.RequestException as e:
             print(f"Failed to revoke token (continuing with logout): {e}")
@@ -464,4 +670,13 @@ if __name__ == "__main__":
     print(f"Redirect URI: {REDIRECT_URI}")
     print(f"Open http://localhost:{PORT} in your browser")
 
-    app.run(host="0.0.0.0", port=PORT, debug=True)
+    # Warm the OIDC caches so the first login doesn't pay for them
+    try:
+        warm_oidc_caches()
+    except requests.RequestException as e:
+        print(f"Warning: could not prefetch OIDC configuration: {e}")
+
+    if DEBUG:
+        print("Debug mode enabled - do not use in production!")
+    # Development server only; see the README for running under gunicorn
+    app.run(host="0.0.0.0", port=PORT, debug=DEBUG)
@@ -5,12 +5,16 @@ SendSeven API - Media Attachments Example
 Demonstrates how to upload files and send media messages using the SendSeven API.
 """
 
+import io
+import mimetypes
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional
 
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -45,6 +49,47 @@ SUPPORTED_TYPES = {
     "audio": ["audio/aac", "audio/mpeg", "audio/ogg", "audio/amr", "audio/opus"],
 }
 
+# Reverse lookup: content type -> message type
+MESSAGE_TYPES = {ct: msg_type for msg_type, types in SUPPORTED_TYPES.items() for ct in types}
+
+# Content types by file extension. These are the types the API accepts,
+# so they take precedence over the platform's mimetypes database, which
+# disagrees on some of them (e.g. .3gp, .opus).
+CONTENT_TYPES = {
+    # Images
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+    # Documents
+    ".pdf": "application/pdf",
+    ".doc": "application/msword",
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".xls": "application/vnd.ms-excel",
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ".ppt": "application/vnd.ms-powerpoint",
+    ".pptx": "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+    ".txt": "text/plain",
+    # Video
+    ".mp4": "video/mp4",
+    ".3gp": "video/3gpp",
+    # Audio
+    ".aac": "audio/aac",
+    ".mp3": "audio/mpeg",
+    ".ogg": "audio/ogg",
+    ".amr": "audio/amr",
+    ".opus": "audio/opus",
+}
+
+# Maximum file size by message type
+MAX_SIZES = {
+    "image": IMAGE_MAX_SIZE,
+    "document": DOCUMENT_MAX_SIZE,
+    "video": VIDEO_MAX_SIZE,
+    "audio": AUDIO_MAX_SIZE,
+}
+
 
 def get_headers() -> dict:
     """Get the standard API headers."""
@@ -54,55 +99,84 @@ def get_headers() -> dict:
     }
 
 
+# Timeout (seconds) for each API call
+REQUEST_TIMEOUT = 10
+# Uploads use (connect, read): the server may take a while to store a large
+# file before it responds, so its answer gets longer than other calls. Each
+# chunk written to the socket is still bounded by the connect timeout.
+UPLOAD_TIMEOUT = (REQUEST_TIMEOUT, 60)
+
+# Shared session so uploads and sends reuse pooled keep-alive connections
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=10))
+SESSION.headers.update(get_headers())
+
+
 def get_content_type(file_path: str) -> str:
     """Determine content type from file extension."""
     ext = Path(file_path).suffix.lower()
-    content_types = {
-        # Images
-        ".jpg": "image/jpeg",
-        ".jpeg": "image/jpeg",
-        ".png": "image/png",
-        ".gif": "image/gif",
-        ".webp": "image/webp",
-        # Documents
-        ".pdf": "application/pdf",
-        ".doc": "application/msword",
-        ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-        ".xls": "application/vnd.ms-excel",
-        ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        ".ppt": "application/vnd.ms-powerpoint",
-        ".pptx": "application/vnd.openxmlformats-officedocument.presentationml.presentation",
-        ".txt": "text/plain",
-        # Video
-        ".mp4": "video/mp4",
-        ".3gp": "video/3gpp",
-        # Audio
-        ".aac": "audio/aac",
-        ".mp3": "audio/mpeg",
-        ".ogg": "audio/ogg",
-        ".amr": "audio/amr",
-        ".opus": "audio/opus",
-    }
-    return content_types.get(ext, "application/octet-stream")
+    if ext in CONTENT_TYPES:
+        return CONTENT_TYPES[ext]
+    # Fall back to the stdlib table so unsupported files are reported by
+    # their real type; compressed files (e.g. .pdf.gz) are not that type
+    content_type, encoding = mimetypes.guess_type(file_path)
+    if content_type is None or encoding is not None:
+        return "application/octet-stream"
+    return content_type
 
 
 def get_message_type(content_type: str) -> str:
     """Determine message type from content type."""
-    for msg_type, types in SUPPORTED_TYPES.items():
-        if content_type in types:
-            return msg_type
-    raise ValueError(f"Unsupported content type: {content_type}")
+    try:
+        return MESSAGE_TYPES[content_type]
+    except KeyError:
+        raise ValueError(f"Unsupported content type: {content_type}")
 
 
 def get_max_size(message_type: str) -> int:
     """Get maximum file size for a message type."""
-    limits = {
-        "image": IMAGE_MAX_SIZE,
-        "document": DOCUMENT_MAX_SIZE,
-        "video": VIDEO_MAX_SIZE,
-        "audio": AUDIO_MAX_SIZE,
-    }
-    return limits.get(message_type, DOCUMENT_MAX_SIZE)
+    return MAX_SIZES.get(message_type, DOCUMENT_MAX_SIZE)
+
+
+class MultipartFileBody:
+    """
+    multipart/form-data body for a single file, read from disk in chunks.
+
+    requests' files= helper builds the whole multipart body in memory; this
+    object is passed as data= instead, so a 100 MB document is streamed to
+    the socket without ever being held in RAM. It has a known length, so the
+    request is sent with Content-Length rather than chunked encoding.
+
+    The caller opens (and closes) the file and passes its size.
+    """
+
+    def __init__(self, field_name: str, file, file_size: int, filename: str, content_type: str):
+        boundary = os.urandom(16).hex()
+        # Percent-encode the characters that could end the quoted value or
+        # the header line (LF, CR, quote), as urllib3 does for files=
+        filename = filename.translate({10: "%0A", 13: "%0D", 34: "%22"})
+        head = (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="{field_name}"; filename="{filename}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode("utf-8")
+        tail = f"\r\n--{boundary}--\r\n".encode("ascii")
+
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        self._length = len(head) + file_size + len(tail)
+        self._parts = [io.BytesIO(head), file, io.BytesIO(tail)]
+
+    def __len__(self) -> int:
+        return self._length
+
+    def read(self, size: int = -1) -> bytes:
+        """Read up to size bytes, moving on to the next part when one is exhausted."""
+        while self._parts:
+            chunk = self._parts[0].read(size)
+            if chunk:
+                return chunk
+            self._parts.pop(0)
+        return b""
 
 
 def upload_attachment(file_path: str) -> dict:
@@ -120,33 +194,37 @@ def upload_attachment(file_path: str) -> dict:
         ValueError: If file type is unsupported or file is too large
         requests.HTTPError: If the API request fails
     """
-    # Validate file exists
-    if not os.path.exists(file_path):
-        raise FileNotFoundError(f"File not found: {file_path}")
-
-    # Get file info
-    file_size = os.path.getsize(file_path)
-    filename = os.path.basename(file_path)
-    content_type = get_content_type(file_path)
-
-    # Determine message type and validate
-    try:
-        message_type = get_message_type(content_type)
-    except ValueError:
-        raise ValueError(f"Unsupported file type: {content_type}")
-
-    # Check file size
-    max_size = get_max_size(message_type)
-    if file_size > max_size:
-        raise ValueError(
-            f"File too large: {file_size} bytes (max {max_size} bytes for {message_type})"
-        )
-
     url = f"{API_URL}/attachments"
 
+    # Open the file once (raising FileNotFoundError if it doesn't exist);
+    # its size comes from the open descriptor, so the size check and the
+    # upload can't see two different files
     with open(file_path, "rb") as f:
-        files = {"file": (filename, f, content_type)}
-        response = requests.post(url, files=files, headers=get_headers())
+        # Get file info
+        file_size = os.fstat(f.fileno()).st_size
+        filename = os.path.basename(file_path)
+        content_type = get_content_type(file_path)
+
+        # Determine message type and validate
+        try:
+            message_type = get_message_type(content_type)
+        except ValueError:
+            raise ValueError(f"Unsupported file type: {content_type}")
+
+        # Check file size
+        max_size = get_max_size(message_type)
+        if file_size > max_size:
+            raise ValueError(
+                f"File too large: {file_size} bytes (max {max_size} bytes for {message_type})"
+            )
+
+        body = MultipartFileBody("file", f, file_size, filename, content_type)
+        response = SESSION.post(
+            url,
+            data=body,
+            headers={"Content-Type": body.content_type},
+            timeout=UPLOAD_TIMEOUT,
+        )
 
     if response.status_code == 413:
         raise ValueError("File too large (server rejected)")
@@ -180,9 +258,6 @@ def send_media_message(
     """
     url = f"{API_URL}/messages"
 
-    headers = get_headers()
-    headers["Content-Type"] = "application/json"
-
     payload = {
         "conversation_id": conversation_id,
         "message_type": message_type,
@@ -192,7 +267,7 @@ def send_media_message(
     if caption:
         payload["text"] = caption
 
-    response = requests.post(url, json=payload, headers=headers)
+    response = SESSION.post(url, json=payload, timeout=REQUEST_TIMEOUT)
     response.raise_for_status()
 
     return response.json()
@@ -282,6 +357,35 @@ def send_audio(conversation_id: str, file_path: str, caption: Optional[str] = No
     return message
 
 
+def send_media_batch(conversation_id: str, file_paths: list, max_workers: int = 8) -> list:
+    """
+    Upload several files concurrently, then send one media message per file.
+
+    Uploads run in parallel over the shared session's connection pool.
+    The messages are sent one at a time afterwards, in the order of
+    file_paths, so they appear in the conversation in that order. If any
+    upload fails, its exception is raised and no messages are sent.
+
+    Args:
+        conversation_id: The UUID of the conversation
+        file_paths: Paths to the files to send
+        max_workers: Maximum number of concurrent uploads
+
+    Returns:
+        list: The created message objects, in the order of file_paths
+    """
+    print(f"Uploading {len(file_paths)} files...")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        attachments = list(executor.map(upload_attachment, file_paths))
+
+    messages = []
+    for file_path, attachment in zip(file_paths, attachments):
+        message_type = get_message_type(get_content_type(file_path))
+        print(f"Sending {message_type} message for {attachment['id']}...")
+        messages.append(send_media_message(conversation_id, attachment["id"], message_type))
+    return messages
+
+
 def demo_upload_and_send(file_path: str):
     """
     Demo: Upload a file and send it as a message.
@@ -334,11 +438,13 @@ def main():
     print(f"API URL: {API_URL}")
     print(f"Conversation: {CONVERSATION_ID}")
 
-    # Check for command line argument (file to upload)
+    # Check for command line arguments (files to upload)
     if len(sys.argv) > 1:
-        file_path = sys.argv[1]
         try:
-            demo_upload_and_send(file_path)
+            if len(sys.argv) > 2:
+                send_media_batch(CONVERSATION_ID, sys.argv[1:])
+            else:
+                demo_upload_and_send(sys.argv[1])
         except FileNotFoundError as e:
             print(f"Error: {e}")
         except ValueError as e:
@@ -347,7 +453,7 @@ def main():
             print(f"API Error: {e.response.status_code}")
             print(f"Response: {e.response.text}")
     else:
-        print("\nUsage: python media_attachments.py <file_path>")
+        print("\nUsage: python media_attachments.py <file_path> [<file_path> ...]")
         print("\nSupported file types:")
         print("  Images:    .jpg, .jpeg, .png, .gif, .webp (max 16 MB)")
         print("  Documents: .pdf, .doc, .docx, .xls, .xlsx, .ppt, .pptx, .txt (max 100 MB)")
@@ -355,6 +461,7 @@ def main():
         print("  Audio:     .aac, .mp3, .ogg, .amr, .opus (max 16 MB)")
         print("\nExample:")
         print("  python media_attachments.py /path/to/image.jpg")
+        print("  python media_attachments.py photo1.jpg photo2.jpg report.pdf")
 
         # Demo with a sample file if it exists
         sample_files = ["sample.jpg", "sample.png", "sample.pdf"]
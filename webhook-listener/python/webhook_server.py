@@ -7,9 +7,14 @@ Demonstrates how to receive and verify SendSeven webhook events.
 
 import os
 import hmac
-import hashlib
 import json
-from flask import Flask, request, jsonify
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+
+from flask import Flask, Response, request, jsonify
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -18,77 +23,192 @@ app = Flask(__name__)
 
 # Configuration
 WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_SECRET_BYTES = WEBHOOK_SECRET.encode("utf-8")
+# HMAC keyed once at startup; each verification clones it instead of
+# re-deriving the inner/outer key blocks from the secret
+WEBHOOK_HMAC = hmac.new(WEBHOOK_SECRET_BYTES, digestmod="sha256")
 PORT = int(os.getenv("PORT", 3000))
+DEBUG = os.getenv("FLASK_DEBUG", "false").lower() in ("true", "1", "yes")
 LOG_PAYLOADS = os.getenv("LOG_PAYLOADS", "false").lower() in ("true", "1", "yes")
-
-
-def verify_signature(payload: bytes, signature: str, timestamp: str) -> bool:
+# Reject webhooks whose timestamp is further than this from our clock
+# (replay protection); 0 disables the check
+WEBHOOK_TOLERANCE_SECONDS = int(os.getenv("WEBHOOK_TOLERANCE_SECONDS", 300))
+
+# Events are handled in the background so webhooks are acknowledged
+# immediately. A single worker keeps them in the order they arrived.
+# The queue lives in memory: events still queued when the process
+# exits are lost, so use a durable queue for work that must not be.
+EVENT_EXECUTOR = ThreadPoolExecutor(max_workers=1)
+
+# Track processed delivery IDs so retried deliveries are acknowledged
+# without being verified or handled again. Entries expire after
+# DELIVERY_TTL seconds and the oldest are evicted past MAX_DELIVERIES, so
+# memory stays bounded on a long-running server.
+MAX_DELIVERIES = 100_000
+DELIVERY_TTL = 3600
+processed_deliveries = OrderedDict()  # delivery_id -> time processed
+processed_lock = threading.Lock()
+
+# Canonical JSON form covered by the signature (sorted keys, compact);
+# built once instead of on every json.dumps call
+CANONICAL_JSON = json.JSONEncoder(separators=(",", ":"), sort_keys=True)
+
+# Start of the success response body; only the delivery ID varies
+SUCCESS_PREFIX = b'{"success":true,"delivery_id":'
+
+# Shared read-only stand-in for missing or null payload sections, so
+# handlers don't allocate a fresh {} default on every lookup
+EMPTY = MappingProxyType({})
+
+
+def is_duplicate(delivery_id: str) -> bool:
+    """Check whether a delivery was already processed within the TTL."""
+    with processed_lock:
+        processed_at = processed_deliveries.get(delivery_id)
+    return processed_at is not None and time.monotonic() - processed_at < DELIVERY_TTL
+
+
+def mark_processed(delivery_id: str) -> None:
+    """Remember a delivery ID, evicting expired and excess entries."""
+    now = time.monotonic()
+    with processed_lock:
+        processed_deliveries[delivery_id] = now
+        processed_deliveries.move_to_end(delivery_id)
+
+        # Entries are kept oldest-first, so only the front needs checking
+        while processed_deliveries:
+            processed_at = next(iter(processed_deliveries.values()))
+            if len(processed_deliveries) <= MAX_DELIVERIES and now - processed_at < DELIVERY_TTL:
+                break
+            processed_deliveries.popitem(last=False)
+
+
+def verify_signature(payload: dict, signature: str, timestamp: str) -> bool:
     """
     Verify the webhook signature using HMAC-SHA256.
 
+    Takes the already-parsed payload so the body is only decoded once;
+    the signature covers its canonical (sorted, compact) JSON form.
+
     Args:
-        payload: Raw request body bytes
+        payload: Parsed request body
         signature: Value of X-Sendseven-Signature header
         timestamp: Value of X-Sendseven-Timestamp header
 
     Returns:
-        bool: True if signature is valid
+        bool: True if signature is valid and the timestamp is recent
     """
-    if not signature.startswith("sha256="):
+    # Expect "sha256=" followed by exactly 64 hex characters
+    if not signature.startswith("sha256=") or len(signature) != 71:
         return False
 
-    provided_sig = signature[7:]  # Remove 'sha256=' prefix
+    try:
+        provided_sig = bytes.fromhex(signature[7:])  # Remove 'sha256=' prefix
+    except ValueError:
+        return False
+
+    # Reject stale or malformed timestamps before doing any hashing
+    try:
+        age = abs(time.time() - int(timestamp))
+    except ValueError:
+        return False
+    if WEBHOOK_TOLERANCE_SECONDS and age > WEBHOOK_TOLERANCE_SECONDS:
+        return False
 
     # Reconstruct the message: timestamp.json_payload
     # Sort keys to ensure consistent JSON serialization
-    payload_dict = json.loads(payload)
-    json_payload = json.dumps(payload_dict, separators=(",", ":"), sort_keys=True)
+    json_payload = CANONICAL_JSON.encode(payload)
     message = f"{timestamp}.{json_payload}"
 
-    # Compute expected signature
-    expected_sig = hmac.new(
-        WEBHOOK_SECRET.encode("utf-8"),
-        message.encode("utf-8"),
-        hashlib.sha256
-    ).hexdigest()
+    # Compute expected signature from a copy of the pre-keyed HMAC
+    mac = WEBHOOK_HMAC.copy()
+    mac.update(message.encode("utf-8"))
+    expected_sig = mac.digest()
 
-    # Timing-safe comparison
+    # Timing-safe comparison of the raw 32-byte digests
     return hmac.compare_digest(expected_sig, provided_sig)
 
 
+def parse_payload(body: bytes):
+    """Parse a webhook body, returning None unless it is a JSON object."""
+    try:
+        payload = json.loads(body)
+    except ValueError as e:
+        print(f"Failed to parse JSON: {e}")
+        return None
+    return payload if isinstance(payload, dict) else None
+
+
 @app.route("/webhooks/sendseven", methods=["POST"])
 def handle_webhook():
     """Handle incoming SendSeven webhooks."""
-    # Parse payload first to check for verification challenge
-    try:
-        payload = request.get_json()
-    except Exception as e:
-        print(f"Failed to parse JSON: {e}")
-        return jsonify({"error": "Invalid JSON"}), 400
+    body = request.get_data()
+    payload = None
 
     # Handle verification challenges (no signature verification needed)
-    # SendSeven sends this when you create/update a webhook to verify ownership
-    if payload.get("type") == "sendseven_verification":
-        challenge = payload.get("challenge")
-        print(f"Verification challenge received: {challenge[:8]}...")
-        return jsonify({"challenge": challenge}), 200
+    # SendSeven sends this when you create/update a webhook to verify ownership.
+    # A byte search spots them cheaply, so regular events aren't parsed
+    # until they have passed the header and duplicate checks below.
+    if b'"sendseven_verification"' in body:
+        payload = parse_payload(body)
+        if payload is None:
+            return jsonify({"error": "Invalid JSON"}), 400
+        if payload.get("type") == "sendseven_verification":
+            challenge = payload.get("challenge")
+            print(f"Verification challenge received: {challenge[:8]}...")
+            return jsonify({"challenge": challenge}), 200
+
+    # Without a secret every signature check would use an empty key, which
+    # anyone can reproduce; refuse regular events instead (fail closed)
+    if not WEBHOOK_SECRET:
+        print("WEBHOOK_SECRET not set - rejecting webhook")
+        return jsonify({"error": "Webhook secret not configured"}), 503
 
     # Get headers for regular events
-    signature = request.headers.get("X-Sendseven-Signature", "")
-    timestamp = request.headers.get("X-Sendseven-Timestamp", "")
-    delivery_id = request.headers.get("X-Sendseven-Delivery-Id", "")
-    event_type = request.headers.get("X-Sendseven-Event", "")
-
-    # Verify required headers
-    if not all([signature, timestamp, delivery_id, event_type]):
+    headers = request.headers
+    signature = headers.get("X-Sendseven-Signature", "")
+    timestamp = headers.get("X-Sendseven-Timestamp", "")
+    delivery_id = headers.get("X-Sendseven-Delivery-Id", "")
+
+    # Verify required headers (the event type is dispatched from the
+    # payload, so its header is only checked, not kept)
+    if not (signature and timestamp and delivery_id and headers.get("X-Sendseven-Event")):
         print("Missing required webhook headers")
         return jsonify({"error": "Missing required headers"}), 400
 
-    # Verify signature (payload already parsed above)
-    if not verify_signature(request.data, signature, timestamp):
+    # Acknowledge retried deliveries without verifying or handling them again
+    if is_duplicate(delivery_id):
+        print(f"Duplicate delivery {delivery_id}, skipping")
+        return jsonify({"success": True, "delivery_id": delivery_id, "duplicate": True}), 200
+
+    # The signature covers the canonical JSON form, so parse before verifying
+    if payload is None:
+        payload = parse_payload(body)
+        if payload is None:
+            return jsonify({"error": "Invalid JSON"}), 400
+
+    if not verify_signature(payload, signature, timestamp):
         print(f"Invalid signature for delivery {delivery_id}")
         return jsonify({"error": "Invalid signature"}), 401
 
+    # Log and handle the event in the background
+    mark_processed(delivery_id)
+    EVENT_EXECUTOR.submit(process_event, delivery_id, payload)
+
+    # Always return 200 quickly. The body is {"success": true,
+    # "delivery_id": ...} built without jsonify; the ID comes from a header
+    # the signature doesn't cover, so it is still JSON-escaped.
+    body = SUCCESS_PREFIX + json.dumps(delivery_id).encode("ascii") + b"}"
+    return Response(body, status=200, mimetype="application/json")
+
+
+def process_event(delivery_id: str, payload: dict):
+    """
+    Log an event and dispatch it to its handler (runs on EVENT_EXECUTOR).
+
+    Logging happens here rather than in handle_webhook so that writing to
+    stdout (and pretty-printing the payload) never delays the response.
+    """
     event_type_key = payload.get("type", "")
     tenant_id = payload.get("tenant_id", "")
 
@@ -98,104 +218,51 @@ def handle_webhook():
     if LOG_PAYLOADS:
         print(f"Full payload:\n{json.dumps(payload, indent=2)}")
 
-    # Handle different event types
     try:
-        # Message events (WhatsApp, Telegram, SMS, etc.)
-        if event_type_key == "message.received":
-            handle_message_received(payload)
-        elif event_type_key == "message.sent":
-            handle_message_sent(payload)
-        elif event_type_key == "message.delivered":
-            handle_message_delivered(payload)
-        elif event_type_key == "message.failed":
-            handle_message_failed(payload)
-        elif event_type_key == "message.read":
-            handle_message_read(payload)
-
-        # Email events
-        elif event_type_key == "email.received":
-            handle_email_received(payload)
-        elif event_type_key == "email.sent":
-            handle_email_sent(payload)
-        elif event_type_key == "email.delivered":
-            handle_email_delivered(payload)
-        elif event_type_key == "email.bounced":
-            handle_email_bounced(payload)
-        elif event_type_key == "email.opened":
-            handle_email_opened(payload)
-        elif event_type_key == "email.complained":
-            handle_email_complained(payload)
-
-        # Conversation events
-        elif event_type_key == "conversation.created":
-            handle_conversation_created(payload)
-        elif event_type_key == "conversation.closed":
-            handle_conversation_closed(payload)
-        elif event_type_key == "conversation.assigned":
-            handle_conversation_assigned(payload)
-        elif event_type_key == "conversation.reopened":
-            handle_conversation_reopened(payload)
-
-        # Contact events
-        elif event_type_key == "contact.created":
-            handle_contact_created(payload)
-        elif event_type_key == "contact.updated":
-            handle_contact_updated(payload)
-        elif event_type_key == "contact.deleted":
-            handle_contact_deleted(payload)
-        elif event_type_key == "contact.subscribed":
-            handle_contact_subscribed(payload)
-        elif event_type_key == "contact.unsubscribed":
-            handle_contact_unsubscribed(payload)
-
-        # Tracking events
-        elif event_type_key == "link.clicked":
-            handle_link_clicked(payload)
+        handler = EVENT_HANDLERS.get(event_type_key)
+        if handler:
+            handler(payload)
         else:
             print(f"Unknown event type: {event_type_key}")
     except Exception as e:
         print(f"Error processing webhook: {e}")
-        # Still return 200 - webhook was received
-
-    # Always return 200 quickly
-    return jsonify({"success": True, "delivery_id": delivery_id}), 200
 
 
 def handle_message_received(payload: dict):
     """Process message.received event."""
-    data = payload.get("data", {})
-    message = data.get("message", {})
-    contact = data.get("contact", {})
+    data = payload.get("data") or EMPTY
+    message = data.get("message") or EMPTY
+    contact = data.get("contact") or EMPTY
     contact_name = contact.get("name") or contact.get("phone") or contact.get("email") or "Unknown"
     print(f"  Message received from {contact_name}: {message.get('text', '')[:50]}")
 
 
 def handle_message_sent(payload: dict):
     """Process message.sent event."""
-    data = payload.get("data", {})
-    message = data.get("message", {})
+    data = payload.get("data") or EMPTY
+    message = data.get("message") or EMPTY
     print(f"  Message sent: {message.get('id')}")
 
 
 def handle_message_delivered(payload: dict):
     """Process message.delivered event."""
-    data = payload.get("data", {})
-    message = data.get("message", {})
+    data = payload.get("data") or EMPTY
+    message = data.get("message") or EMPTY
     print(f"  Message delivered: {message.get('id')}")
 
 
 def handle_message_failed(payload: dict):
     """Process message.failed event."""
-    data = payload.get("data", {})
-    message = data.get("message", {})
-    error = data.get("error", {})
+    data = payload.get("data") or EMPTY
+    message = data.get("message") or EMPTY
+    error = data.get("error") or EMPTY
     print(f"  Message failed: {message.get('id')} - {error.get('message', 'Unknown error')}")
 
 
 def handle_message_read(payload: dict):
     """Process message.read event."""
-    data = payload.get("data", {})
-    message = data.get("message", {})
+    data = payload.get("data") or EMPTY
+    message = data.get("message") or EMPTY
     print(f"  Message read: {message.get('id')}")
 
 
@@ -205,30 +272,30 @@ def handle_message_read(payload: dict):
 
 def handle_email_received(payload: dict):
     """Process email.received event."""
-    data = payload.get("data", {})
-    email = data.get("email", {})
-    contact = data.get("contact", {})
+    data = payload.get("data") or EMPTY
+    email = data.get("email") or EMPTY
+    contact = data.get("contact") or EMPTY
     print(f"  Email received from {email.get('from_email', 'Unknown')}: {email.get('subject', 'No subject')[:50]}")
 
 
 def handle_email_sent(payload: dict):
     """Process email.sent event."""
-    data = payload.get("data", {})
-    email = data.get("email", {})
+    data = payload.get("data") or EMPTY
+    email = data.get("email") or EMPTY
     print(f"  Email sent: {email.get('id')} to {email.get('to_emails', [])}")
 
 
 def handle_email_delivered(payload: dict):
     """Process email.delivered event."""
-    data = payload.get("data", {})
-    email = data.get("email", {})
+    data = payload.get("data") or EMPTY
+    email = data.get("email") or EMPTY
     print(f"  Email delivered: {email.get('id')} (message_id: {email.get('message_id', 'N/A')})")
 
 
 def handle_email_bounced(payload: dict):
     """Process email.bounced event."""
-    data = payload.get("data", {})
-    email = data.get("email", {})
+    data = payload.get("data") or EMPTY
+    email = data.get("email") or EMPTY
     bounce_type = data.get("bounce_type", "unknown")
     bounce_subtype = data.get("bounce_subtype", "")
     print(f"  Email bounced: {email.get('id')} - {bounce_type}/{bounce_subtype}")
@@ -236,16 +303,16 @@ def handle_email_bounced(payload: dict):
 
 def handle_email_opened(payload: dict):
     """Process email.opened event."""
-    data = payload.get("data", {})
-    email = data.get("email", {})
+    data = payload.get("data") or EMPTY
+    email = data.get("email") or EMPTY
     open_count = data.get("open_count", 1)
     print(f"  Email opened: {email.get('id')} (open_count: {open_count})")
 
 
 def handle_email_complained(payload: dict):
     """Process email.complained event (spam report)."""
-    data = payload.get("data", {})
-    email = data.get("email", {})
+    data = payload.get("data") or EMPTY
+    email = data.get("email") or EMPTY
     complaint_type = data.get("complaint_type", "unknown")
     print(f"  Email complained (spam report): {email.get('id')} - {complaint_type}")
 
@@ -256,30 +323,30 @@ def handle_email_complained(payload: dict):
 
 def handle_conversation_created(payload: dict):
     """Process conversation.created event."""
-    data = payload.get("data", {})
-    conversation = data.get("conversation", {})
+    data = payload.get("data") or EMPTY
+    conversation = data.get("conversation") or EMPTY
     print(f"  Conversation created: {conversation.get('id')}")
 
 
 def handle_conversation_closed(payload: dict):
     """Process conversation.closed event."""
-    data = payload.get("data", {})
-    conversation = data.get("conversation", {})
+    data = payload.get("data") or EMPTY
+    conversation = data.get("conversation") or EMPTY
     print(f"  Conversation closed: {conversation.get('id')}")
 
 
 def handle_conversation_assigned(payload: dict):
     """Process conversation.assigned event."""
-    data = payload.get("data", {})
-    conversation = data.get("conversation", {})
-    assigned_to = data.get("assigned_to", {})
+    data = payload.get("data") or EMPTY
+    conversation = data.get("conversation") or EMPTY
+    assigned_to = data.get("assigned_to") or EMPTY
     print(f"  Conversation {conversation.get('id')} assigned to {assigned_to.get('name', 'Unknown')}")
 
 
 def handle_conversation_reopened(payload: dict):
     """Process conversation.reopened event."""
-    data = payload.get("data", {})
-    conversation = data.get("conversation", {})
+    data = payload.get("data") or EMPTY
+    conversation = data.get("conversation") or EMPTY
     print(f"  Conversation reopened: {conversation.get('id')}")
 
 
@@ -289,60 +356,100 @@ def handle_conversation_reopened(payload: dict):
 
 def handle_contact_created(payload: dict):
     """Process contact.created event."""
-    data = payload.get("data", {})
-    contact = data.get("contact", {})
+    data = payload.get("data") or EMPTY
+    contact = data.get("contact") or EMPTY
     contact_name = contact.get("name") or contact.get("phone") or contact.get("email") or "Unknown"
     print(f"  Contact created: {contact_name} ({contact.get('phone', 'No phone')})")
 
 
 def handle_contact_updated(payload: dict):
     """Process contact.updated event."""
-    data = payload.get("data", {})
-    contact = data.get("contact", {})
-    changes = data.get("changes", {})
+    data = payload.get("data") or EMPTY
+    contact = data.get("contact") or EMPTY
+    changes = data.get("changes") or EMPTY
     print(f"  Contact updated: {contact.get('id')} - changes: {list(changes.keys())}")
 
 
 def handle_contact_deleted(payload: dict):
     """Process contact.deleted event."""
-    data = payload.get("data", {})
-    contact = data.get("contact", {})
+    data = payload.get("data") or EMPTY
+    contact = data.get("contact") or EMPTY
     contact_name = contact.get("name") or contact.get("phone") or contact.get("email") or "Unknown"
     print(f"  Contact deleted: {contact.get('id')} ({contact_name})")
 
 
 def handle_contact_subscribed(payload: dict):
     """Process contact.subscribed event."""
-    data = payload.get("data", {})
-    contact = data.get("contact", {})
-    subscription = data.get("subscription", {})
+    data = payload.get("data") or EMPTY
+    contact = data.get("contact") or EMPTY
+    subscription = data.get("subscription") or EMPTY
     contact_name = contact.get("name") or contact.get("phone") or contact.get("email") or "Unknown"
     print(f"  Contact {contact_name} subscribed to list {subscription.get('list_id')}")
 
 
 def handle_contact_unsubscribed(payload: dict):
     """Process contact.unsubscribed event."""
-    data = payload.get("data", {})
-    contact = data.get("contact", {})
-    subscription = data.get("subscription", {})
+    data = payload.get("data") or EMPTY
+    contact = data.get("contact") or EMPTY
+    subscription = data.get("subscription") or EMPTY
     contact_name = contact.get("name") or contact.get("phone") or contact.get("email") or "Unknown"
     print(f"  Contact {contact_name} unsubscribed from list {subscription.get('list_id')}")
 
 
 def handle_link_clicked(payload: dict):
     """Process link.clicked event."""
-    data = payload.get("data", {})
-    link = data.get("link", {})
-    contact = data.get("contact", {})
+    data = payload.get("data") or EMPTY
+    link = data.get("link") or EMPTY
+    contact = data.get("contact") or EMPTY
     contact_name = contact.get("name") or contact.get("phone") or contact.get("email") or "Unknown"
     print(f"  Link clicked: {link.get('url', 'Unknown URL')} by {contact_name}")
 
 
+# Event type -> handler, used by handle_webhook to dispatch each event
+EVENT_HANDLERS = {
+    # Message events (WhatsApp, Telegram, SMS, etc.)
+    "message.received": handle_message_received,
+    "message.sent": handle_message_sent,
+    "message.delivered": handle_message_delivered,
+    "message.failed": handle_message_failed,
+    "message.read": handle_message_read,
+
+    # Email events
+    "email.received": handle_email_received,
+    "email.sent": handle_email_sent,
+    "email.delivered": handle_email_delivered,
+    "email.bounced": handle_email_bounced,
+    "email.opened": handle_email_opened,
+    "email.complained": handle_email_complained,
+
+    # Conversation events
+    "conversation.created": handle_conversation_created,
+    "conversation.closed": handle_conversation_closed,
+    "conversation.assigned": handle_conversation_assigned,
+    "conversation.reopened": handle_conversation_reopened,
+
+    # Contact events
+    "contact.created": handle_contact_created,
+    "contact.updated": handle_contact_updated,
+    "contact.deleted": handle_contact_deleted,
+    "contact.subscribed": handle_contact_subscribed,
+    "contact.unsubscribed": handle_contact_unsubscribed,
+
+    # Tracking events
+    "link.clicked": handle_link_clicked,
+}
+
+
 if __name__ == "__main__":
     if not WEBHOOK_SECRET:
-        print("Warning: WEBHOOK_SECRET not set - signatures will not be verified!")
+        print("ERROR: WEBHOOK_SECRET must be set!")
+        print("Use the secret shown when you created the webhook in the SendSeven dashboard.")
+        exit(1)
 
     print(f"Starting webhook server on port {PORT}")
     print(f"Payload logging: {'ENABLED' if LOG_PAYLOADS else 'disabled'}")
     print(f"Webhook endpoint: http://localhost:{PORT}/webhooks/sendseven")
-    app.run(host="0.0.0.0", port=PORT, debug=True)
+    if DEBUG:
+        print("Debug mode enabled - do not use in production!")
+    # Development server only; see the README for running under gunicorn
+    app.run(host="0.0.0.0", port=PORT, debug=DEBUG)
@@ -11,10 +11,15 @@ Features:
 - Error handling for template not found, unapproved templates
 """
 
+import atexit
 import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
-from typing import Optional
 
 # Load environment variables from .env file
 load_dotenv()
@@ -26,14 +31,68 @@ API_URL = os.getenv("SENDSEVEN_API_URL", "https://api.sendseven.com/api/v1")
 CHANNEL_ID = os.getenv("CHANNEL_ID")
 CONTACT_ID = os.getenv("CONTACT_ID")
 
-
-def get_headers() -> dict:
-    """Get common headers for API requests."""
-    return {
-        "Authorization": f"Bearer {API_TOKEN}",  # Bearer token authentication
-        "X-Tenant-ID": TENANT_ID,
-        "Content-Type": "application/json",
-    }
+# Required settings that are unset; the environment is only read at
+# import, so this is worked out once rather than on every validate_config()
+MISSING_CONFIG = tuple(
+    name
+    for name, value in (
+        ("SENDSEVEN_API_TOKEN", API_TOKEN),
+        ("SENDSEVEN_TENANT_ID", TENANT_ID),
+        ("CHANNEL_ID", CHANNEL_ID),
+        ("CONTACT_ID", CONTACT_ID),
+    )
+    if not value
+)
+
+# Endpoint URLs (built once; API_URL doesn't change at runtime)
+TEMPLATES_URL = f"{API_URL}/whatsapp/templates"
+SEND_TEMPLATE_URL = f"{API_URL}/messages/send/template"
+
+# Common headers for API requests (built once; the values never change)
+HEADERS = {
+    "Authorization": f"Bearer {API_TOKEN}",  # Bearer token authentication
+    "X-Tenant-ID": TENANT_ID,
+    "Content-Type": "application/json",
+}
+
+# Retry rate limits and transient server errors with exponential backoff.
+# The final failed response is returned so raise_for_status() still applies.
+RETRY_POLICY = Retry(
+    total=3,
+    backoff_factor=1.0,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=frozenset({"GET", "PUT", "DELETE"}),
+    respect_retry_after_header=True,
+    raise_on_status=False,
+)
+
+# POSTs create things, so they are only retried when the API cannot have
+# processed them: the connection failed, or it answered 429 or 503. After
+# a timeout or another 5xx the request may already have taken effect, and
+# sending it again would create a duplicate.
+POST_RETRY_POLICY = Retry(
+    total=3,
+    read=False,
+    backoff_factor=1.0,
+    status_forcelist=(429, 503),
+    allowed_methods=frozenset({"POST"}),
+    respect_retry_after_header=True,
+    raise_on_status=False,
+)
+
+# Timeout (seconds) for each API call
+REQUEST_TIMEOUT = 10
+
+# Shared session so every API call reuses pooled keep-alive connections;
+# POSTs go through their own so they use POST_RETRY_POLICY
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=10, max_retries=RETRY_POLICY))
+SESSION.headers.update(HEADERS)
+POST_SESSION = requests.Session()
+POST_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=10, max_retries=POST_RETRY_POLICY))
+POST_SESSION.headers.update(HEADERS)
+atexit.register(SESSION.close)
+atexit.register(POST_SESSION.close)
 
 
 def list_templates(category: Optional[str] = None, status: str = "APPROVED") -> list:
@@ -50,12 +109,11 @@ def list_templates(category: Optional[str] = None, status: str = "APPROVED") ->
     Raises:
         requests.HTTPError: If the API request fails
     """
-    url = f"{API_URL}/whatsapp/templates"
     params = {"status": status}
     if category:
         params["category"] = category
 
-    response = requests.get(url, headers=get_headers(), params=params)
+    response = SESSION.get(TEMPLATES_URL, params=params, timeout=REQUEST_TIMEOUT)
     response.raise_for_status()
 
     data = response.json()
@@ -85,8 +143,6 @@ def send_template_message(
     Raises:
         requests.HTTPError: If the API request fails
     """
-    url = f"{API_URL}/messages/send/template"
-
     payload = {
         "channel_id": channel_id,
         "contact_id": contact_id,
@@ -97,12 +153,51 @@ def send_template_message(
     if components:
         payload["components"] = components
 
-    response = requests.post(url, json=payload, headers=get_headers())
+    response = POST_SESSION.post(SEND_TEMPLATE_URL, json=payload, timeout=REQUEST_TIMEOUT)
     response.raise_for_status()
 
     return response.json()
 
 
+def send_templates_bulk(messages: list[dict], max_workers: int = 8) -> list:
+    """
+    Send many template messages concurrently.
+
+    The sends run in parallel over the shared session's connection pool,
+    so a batch costs roughly one round trip per max_workers messages
+    instead of one per message. Messages may be delivered in any order.
+
+    Args:
+        messages: Keyword arguments for send_template_message, one dict
+            per message (channel_id, contact_id, template_name, ...)
+        max_workers: Maximum number of concurrent sends
+
+    Returns:
+        list: For each message, in order, the created message object or
+            the requests.RequestException raised while sending it. After
+            a Timeout or ConnectionError the message may still have been
+            sent, so check before retrying it.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(send_template_message, **message) for message in messages]
+
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except requests.RequestException as e:
+            results.append(e)
+    return results
+
+
+def _body_component(body_params: list[str]) -> dict:
+    """Build a body component filling the template placeholders with text."""
+    return {
+        "type": "body",
+        "parameters": [{"type": "text", "text": param} for param in body_params],
+    }
+
+
 def send_template_with_text_params(
     channel_id: str,
     contact_id: str,
@@ -123,12 +218,7 @@ def send_template_with_text_params(
     Returns:
         dict: The created message object
     """
-    components = [
-        {
-            "type": "body",
-            "parameters": [{"type": "text", "text": param} for param in body_params],
-        }
-    ]
+    components = [_body_component(body_params)]
 
     return send_template_message(
         channel_id=channel_id,
@@ -169,12 +259,7 @@ def send_template_with_header_image(
     ]
 
     if body_params:
-        components.append(
-            {
-                "type": "body",
-                "parameters": [{"type": "text", "text": param} for param in body_params],
-            }
-        )
+        components.append(_body_component(body_params))
 
     return send_template_message(
         channel_id=channel_id,
@@ -222,12 +307,7 @@ def send_template_with_header_document(
     ]
 
     if body_params:
-        components.append(
-            {
-                "type": "body",
-                "parameters": [{"type": "text", "text": param} for param in body_params],
-            }
-        )
+        components.append(_body_component(body_params))
 
     return send_template_message(
         channel_id=channel_id,
@@ -251,10 +331,11 @@ def handle_template_error(error: requests.HTTPError) -> None:
         print(f"Template not found: {error_message}")
         print("Tip: Verify the template name exists and is approved")
     elif status_code == 400:
-        if "not approved" in error_message.lower():
+        message_lower = error_message.lower()
+        if "not approved" in message_lower:
             print(f"Template not approved: {error_message}")
             print("Tip: Only APPROVED templates can be sent")
-        elif "parameter" in error_message.lower():
+        elif "parameter" in message_lower:
             print(f"Parameter mismatch: {error_message}")
             print("Tip: Ensure the number of parameters matches the template")
         else:
@@ -263,25 +344,24 @@ def handle_template_error(error: requests.HTTPError) -> None:
         print("Authentication failed: Check your API token")
     elif status_code == 403:
         print("Permission denied: Token may lack required scopes")
+    elif status_code == 429:
+        # Only reached once RETRY_POLICY has given up retrying
+        retry_after = error.response.headers.get("Retry-After")
+        print("Rate limit exceeded: Too many requests")
+        # Retry-After is either a number of seconds or an HTTP date
+        if retry_after and retry_after.isdigit():
+            print(f"Tip: Wait {retry_after} seconds before sending again")
+        elif retry_after:
+            print(f"Tip: Wait until {retry_after} before sending again")
     else:
         print(f"API Error {status_code}: {error_message}")
 
 
 def validate_config() -> bool:
     """Validate required configuration."""
-    missing = []
-    if not API_TOKEN:
-        missing.append("SENDSEVEN_API_TOKEN")
-    if not TENANT_ID:
-        missing.append("SENDSEVEN_TENANT_ID")
-    if not CHANNEL_ID:
-        missing.append("CHANNEL_ID")
-    if not CONTACT_ID:
-        missing.append("CONTACT_ID")
-
-    if missing:
+    if MISSING_CONFIG:
         print("Error: Missing required environment variables:")
-        for var in missing:
+        for var in MISSING_CONFIG:
             print(f"  - {var}")
         return False
     return True